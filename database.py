@@ -5,11 +5,15 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from bson.codec_options import CodecOptions, TypeDecoder, TypeRegistry
 from datetime import datetime, timezone
 import os
+import asyncio
 from dotenv import load_dotenv
-from typing import Union
+from typing import List, Tuple, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
@@ -18,32 +22,97 @@ load_dotenv()
 _client = None
 db = None
 
+
+class ObjectIdAsStr(TypeDecoder):
+    """Decode ObjectIds straight to str so documents are JSON-ready as read"""
+    bson_type = ObjectId
+
+    def transform_bson(self, value):
+        return str(value)
+
+
+codec_options = CodecOptions(type_registry=TypeRegistry([ObjectIdAsStr()]))
+
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
+# Connection pool sized for expected concurrency; minPoolSize keeps warm sockets around
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 10))
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+
 if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+    _client = AsyncIOMotorClient(
+        database_url,
+        maxPoolSize=MAX_POOL_SIZE,
+        minPoolSize=MIN_POOL_SIZE,
+        waitQueueTimeoutMS=2000,
+        socketTimeoutMS=5000,
+        retryWrites=True,
+    )
+    db = _client.get_database(database_name, codec_options=codec_options)
 
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
+async def warm_pool(connections: int = MIN_POOL_SIZE):
+    """Open pooled connections up front with concurrent pings"""
     if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+        return
+    await asyncio.gather(*(db.command("ping") for _ in range(connections)), return_exceptions=True)
 
-    # Convert Pydantic model to dict if needed
+def to_document(data: Union[BaseModel, dict]) -> dict:
+    """Dump a Pydantic model to a plain dict, or copy a ready dict"""
     if isinstance(data, BaseModel):
-        data_dict = data.model_dump()
-    else:
-        data_dict = data.copy()
+        return data.model_dump()
+    return data.copy()
+
+async def create_document(collection_name: str, data: Union[BaseModel, dict], copy: bool = True):
+    """Insert a single document with timestamp.
+
+    With ``copy=False`` a dict is inserted as-is, and gains ``_id`` and the
+    timestamps; use it for dicts the caller already dumped and owns.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    data_dict = data if not copy and isinstance(data, dict) else to_document(data)
 
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
 
-    result = db[collection_name].insert_one(data_dict)
+    result = await db[collection_name].insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
+async def create_documents(
+    collection_name: str, items: List[Union[BaseModel, dict]], **insert_options
+) -> Tuple[List[str], List[dict]]:
+    """Insert many documents in one round trip, unordered, with timestamps.
+
+    Returns the ids that were inserted and the per-index write errors, so a
+    partial failure still tells the caller which documents made it.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    now = datetime.now(timezone.utc)
+    docs = []
+    for data in items:
+        data_dict = to_document(data)
+        data_dict.setdefault('_id', ObjectId())
+        data_dict['created_at'] = now
+        data_dict['updated_at'] = now
+        docs.append(data_dict)
+
+    try:
+        await db[collection_name].insert_many(docs, ordered=False, **insert_options)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+    else:
+        write_errors = []
+
+    failed = {err["index"] for err in write_errors}
+    inserted_ids = [str(doc['_id']) for i, doc in enumerate(docs) if i not in failed]
+    return inserted_ids, write_errors
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
     """Get documents from collection"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
@@ -52,4 +121,4 @@ def get_documents(collection_name: str, filter_dict: dict = None, limit: int = N
     if limit:
         cursor = cursor.limit(limit)
     
-    return list(cursor)
+    return await cursor.to_list(length=None)
@@ -1,14 +1,71 @@
 import os
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+import re
+import asyncio
+import contextlib
+import hashlib
+import logging
+import operator
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+from cachetools import TTLCache
+from fastapi import BackgroundTasks, FastAPI, Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, Response
+import orjson
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from pydantic import BaseModel, Field
 from bson import ObjectId
+import pymongo
+from pymongo import WriteConcern
+from pymongo.errors import DuplicateKeyError
 
-from database import db, create_document, get_documents
-from schemas import Seller, Store, Product, Order, OrderItem, CustomerInfo
+from database import db, create_document, create_documents, to_document, warm_pool
+from schemas import Seller, Store, Product, Order, OrderItem, CustomerInfo, MAX_ITEM_QUANTITY, MAX_PRICE_CENTS
 
-app = FastAPI(title="WhatsApp-to-MPesa Microstore API", version="0.1.0")
+logger = logging.getLogger(__name__)
+
+# Notifications are log-style documents nobody reads on the request path, so they
+# are written unacknowledged (w=0). Orders keep the default write concern.
+notification_coll = (
+    db["notification"].with_options(write_concern=WriteConcern(w=0)) if db is not None else None
+)
+
+# Notifications are buffered in-process and flushed in batches by a background task.
+NOTIF_BATCH_SIZE = int(os.getenv("NOTIF_BATCH_SIZE", 100))
+NOTIF_FLUSH_INTERVAL = 0.5
+# Caps memory while Mongo is down; past this the oldest notifications are dropped
+NOTIF_BUFFER_LIMIT = NOTIF_BATCH_SIZE * 50
+_notif_buffer: asyncio.Queue = asyncio.Queue(maxsize=NOTIF_BUFFER_LIMIT)
+_notif_flusher: Optional[asyncio.Task] = None
+_pool_warmup: Optional[asyncio.Task] = None
+
+# Stores rarely change, so slug -> store lookups are served from a per-process TTL cache.
+# With several workers this could move to Redis (setex with a JSON payload).
+_store_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+# Checkout idempotency keys live in Redis; without REDIS_URL the header is ignored.
+IDEMPOTENCY_TTL = 600
+# Short socket timeouts turn an unresponsive Redis into a RedisError, so checkout
+# falls back to placing the order instead of hanging
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", 0.5))
+redis_url = os.getenv("REDIS_URL")
+redis_cli = (
+    redis.Redis.from_url(redis_url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+    if redis_url
+    else None
+)
+
+
+# ObjectIds arrive as str (see database.ObjectIdAsStr), so plain orjson is enough
+app = FastAPI(
+    title="WhatsApp-to-MPesa Microstore API",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,19 +75,269 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request, exc: RequestValidationError):
+    # Same body as FastAPI's handler, but orjson renders echoed inf/nan inputs as null
+    # where the stdlib encoder would raise and turn the 422 into a 500
+    return ORJSONResponse(status_code=422, content={"detail": jsonable_encoder(exc.errors())})
+
 # ---------------------- Helpers ----------------------
 
-def to_object_id(id_str: str) -> ObjectId:
+# Below this many items the NumPy array setup costs more than a plain Python sum
+VDOT_MIN_ITEMS = 8
+# Mongo stores ints as at most int64; the float estimate below needs some headroom
+INT64_SAFE_TOTAL = 2**62
+
+
+def order_total(prices: List[int], quantities: List[int]) -> int:
+    """Order total in KES cents from the cart's price and quantity columns"""
+    if len(prices) < VDOT_MIN_ITEMS:
+        total = sum(map(operator.mul, prices, quantities))
+    else:
+        p = np.array(prices, dtype=np.int64)
+        q = np.array(quantities, dtype=np.int64)
+        # int64 vdot wraps silently, so check the magnitude with a float64 estimate first
+        if float(np.dot(p, q.astype(np.float64))) >= INT64_SAFE_TOTAL:
+            total = INT64_SAFE_TOTAL
+        else:
+            total = int(np.vdot(p, q))
+    if total >= INT64_SAFE_TOTAL:
+        raise HTTPException(status_code=400, detail="Order total too large")
+    return total
+
+
+def format_kes(cents: int) -> str:
+    """Format integer cents as a KES amount; only done at the response boundary"""
+    if type(cents) is not int:
+        # A legacy KES float the cents migration missed; refuse rather than show it 100x off
+        raise HTTPException(status_code=500, detail="Amount is not stored in cents")
+    return "%d.%02d" % divmod(cents, 100)
+
+
+def enqueue_notification(doc: dict):
+    """Buffer a notification, evicting the oldest one when the buffer is full"""
+    if _notif_buffer.full():
+        _notif_buffer.get_nowait()
+        logger.warning("Notification buffer full (%d), dropped the oldest", NOTIF_BUFFER_LIMIT)
+    _notif_buffer.put_nowait(doc)
+
+
+async def flush_notifications():
+    """Drain the notification buffer into MongoDB in batches of NOTIF_BATCH_SIZE"""
+    while not _notif_buffer.empty():
+        batch = []
+        while len(batch) < NOTIF_BATCH_SIZE and not _notif_buffer.empty():
+            batch.append(_notif_buffer.get_nowait())
+        if notification_coll is None:
+            continue
+        try:
+            await notification_coll.insert_many(batch, ordered=False)
+        except Exception:
+            # Put the batch back so the next tick retries it
+            for doc in batch:
+                enqueue_notification(doc)
+            raise
+
+
+async def _notification_flusher():
+    while True:
+        await asyncio.sleep(NOTIF_FLUSH_INTERVAL)
+        try:
+            await flush_notifications()
+        except Exception:
+            logger.exception("Notification flush failed, %d queued for retry", _notif_buffer.qsize())
+
+
+@app.on_event("startup")
+async def start_notification_flusher():
+    global _notif_flusher
+    _notif_flusher = asyncio.create_task(_notification_flusher())
+
+
+@app.on_event("shutdown")
+async def stop_notification_flusher():
+    if _notif_flusher is not None:
+        _notif_flusher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _notif_flusher
     try:
-        return ObjectId(id_str)
+        await flush_notifications()
     except Exception:
+        # Nothing is left to retry once the process exits
+        logger.exception("Final notification flush failed, dropping %d", _notif_buffer.qsize())
+
+
+_OID_RE = re.compile(r"[0-9a-fA-F]{24}")
+
+
+def to_object_id(id_str: str) -> ObjectId:
+    if not _OID_RE.fullmatch(id_str):
         raise HTTPException(status_code=400, detail="Invalid id format")
+    # ObjectId(bytes) takes the 12 raw bytes without re-validating hex
+    return ObjectId(bytes.fromhex(id_str))
 
 
-def ensure_unique_slug(slug: str):
-    existing = db["store"].find_one({"slug": slug})
-    if existing:
-        raise HTTPException(status_code=400, detail="Store slug already exists")
+def to_object_ids(id_strs: List[str]) -> List[ObjectId]:
+    if not all(map(_OID_RE.fullmatch, id_strs)):
+        raise HTTPException(status_code=400, detail="Invalid id format")
+    return [ObjectId(bytes.fromhex(s)) for s in id_strs]
+
+
+INDEX_BUILD_TIMEOUT = float(os.getenv("MONGO_INDEX_TIMEOUT", 600))
+
+
+async def ensure_indexes():
+    """Create the indexes the API relies on. Idempotent, safe to run on every boot."""
+    await db["store"].create_index("slug", unique=True)
+    # Only active products are ever listed or sold, so the index skips inactive ones
+    await db["product"].create_index(
+        [("store_slug", 1), ("is_active", 1)],
+        partialFilterExpression={"is_active": True},
+    )
+    await db["order"].create_index([("store_slug", 1), ("status", 1)])
+    await db["notification"].create_index([("order_id", 1)])
+
+
+async def get_store_by_slug(slug: str) -> Optional[dict]:
+    store = _store_cache.get(slug)
+    if store is not None:
+        return store
+    store = await db["store"].find_one({"slug": slug})
+    if store is not None:
+        _store_cache[slug] = store
+    return store
+
+
+def invalidate_store(slug: str):
+    _store_cache.pop(slug, None)
+
+
+async def price_items(
+    store_slug: str, items: List["CheckoutItem"]
+) -> Tuple[List[OrderItem], List[int], List[int]]:
+    """Build order items from the store's current names and prices, in one query.
+
+    The cart is walked once into columns (product ids, quantities); the server
+    prices fill a matching column for order_total.
+    """
+    n = len(items)
+    pids = [None] * n
+    quantities = [0] * n
+    for k, item in enumerate(items):
+        # str(ObjectId) is lowercase hex, so normalise before matching on it
+        pids[k] = item.product_id.lower()
+        quantities[k] = item.quantity
+
+    oids = to_object_ids(pids)
+    cursor = db["product"].find(
+        {"_id": {"$in": oids}, "store_slug": store_slug, "is_active": True},
+        {"name": 1, "price": 1},
+    )
+    products = {p["_id"]: p for p in await cursor.to_list(length=n)}
+
+    prices = [0] * n
+    priced = [None] * n
+    for k, pid in enumerate(pids):
+        product = products.get(pid)
+        if product is None:
+            raise HTTPException(status_code=404, detail=f"Product not found: {pid}")
+        if type(product["price"]) is not int:
+            # Legacy KES float that migrate_money_to_cents has not converted yet
+            raise HTTPException(status_code=500, detail=f"Product has no price in cents: {pid}")
+        prices[k] = product["price"]
+        priced[k] = OrderItem(
+            product_id=pid,
+            name=product["name"],
+            price=product["price"],
+            quantity=items[k].quantity,
+        )
+    return priced, prices, quantities
+
+
+def _kes_to_cents(path: str) -> dict:
+    return {"$toLong": {"$round": [{"$multiply": [path, 100]}, 0]}}
+
+
+def _cents_if_double(path: str) -> dict:
+    return {"$cond": [{"$eq": [{"$type": path}, "double"]}, _kes_to_cents(path), path]}
+
+
+MONEY_MIGRATION_ID = "money_to_cents"
+
+
+async def migrate_money_to_cents():
+    """Convert KES floats written before prices moved to integer cents.
+
+    Runs once per database: a marker in the ``migration`` collection skips the
+    unindexed collection scans on later boots. Only documents still holding
+    doubles match, so workers racing on the first boot are harmless.
+    """
+    if await db["migration"].find_one({"_id": MONEY_MIGRATION_ID}):
+        return
+    await db["product"].update_many(
+        {"price": {"$type": "double"}},
+        [{"$set": {"price": _kes_to_cents("$price")}}],
+    )
+    await db["order"].update_many(
+        {"$or": [{"total": {"$type": "double"}}, {"items.price": {"$type": "double"}}]},
+        [{"$set": {
+            "total": _cents_if_double("$total"),
+            "items": {"$map": {
+                "input": "$items",
+                "as": "item",
+                "in": {"$mergeObjects": ["$$item", {"price": _cents_if_double("$$item.price")}]},
+            }},
+        }}],
+    )
+    await db["migration"].update_one(
+        {"_id": MONEY_MIGRATION_ID},
+        {"$setOnInsert": {"completed_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+
+@app.on_event("startup")
+async def prepare_database():
+    if db is None:
+        return
+    # Like /test, a missing or misbehaving database must not stop the API from booting
+    try:
+        # Fail fast on an unreachable server: inside pymongo.timeout() server
+        # selection would wait for the whole index-build budget
+        await db.command("ping")
+    except Exception:
+        logger.exception("Database unreachable at startup; skipping index creation and migrations")
+        return
+    try:
+        # Index builds can outlast the client's 5s socketTimeoutMS on large collections
+        with pymongo.timeout(INDEX_BUILD_TIMEOUT):
+            await ensure_indexes()
+    except Exception:
+        logger.exception(
+            "Creating indexes failed; store slugs are not enforced unique until this succeeds. "
+            "If existing stores share a slug, rename the duplicates and restart."
+        )
+    try:
+        with pymongo.timeout(INDEX_BUILD_TIMEOUT):
+            await migrate_money_to_cents()
+    except Exception:
+        logger.exception("Migrating prices to cents failed; checkout refuses unmigrated products")
+
+
+@app.on_event("startup")
+async def start_pool_warmup():
+    # Runs in the background so the server accepts requests while sockets are opened
+    global _pool_warmup
+    _pool_warmup = asyncio.create_task(warm_pool())
+
+
+@app.on_event("shutdown")
+async def stop_pool_warmup():
+    if _pool_warmup is not None:
+        _pool_warmup.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _pool_warmup
 
 
 # ---------------------- Auth/Onboarding ----------------------
@@ -45,14 +352,14 @@ class SignupResponse(BaseModel):
     seller_id: str
 
 @app.post("/api/signup", response_model=SignupResponse)
-def signup(payload: SignupRequest):
+async def signup(payload: SignupRequest):
     seller = Seller(
         name=payload.name,
         phone=payload.phone,
         email=payload.email,
         whatsapp_number=payload.whatsapp_number,
     )
-    seller_id = create_document("seller", seller)
+    seller_id = await create_document("seller", seller)
     return {"seller_id": seller_id}
 
 
@@ -69,10 +376,9 @@ class StoreResponse(BaseModel):
     store_id: str
 
 @app.post("/api/store", response_model=StoreResponse)
-def create_store(payload: CreateStoreRequest):
-    ensure_unique_slug(payload.slug)
+async def create_store(payload: CreateStoreRequest):
     # Validate owner exists
-    owner = db["seller"].find_one({"_id": to_object_id(payload.owner_id)})
+    owner = await db["seller"].find_one({"_id": to_object_id(payload.owner_id)})
     if not owner:
         raise HTTPException(status_code=404, detail="Owner not found")
 
@@ -83,17 +389,21 @@ def create_store(payload: CreateStoreRequest):
         description=payload.description,
         whatsapp_number=payload.whatsapp_number or owner.get("whatsapp_number") or owner.get("phone"),
     )
-    store_id = create_document("store", store)
+    try:
+        store_id = await create_document("store", store)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Store slug already exists")
+    invalidate_store(store.slug)
     return {"store_id": store_id}
 
 
 @app.get("/api/store/{slug}")
-def get_store(slug: str):
-    store = db["store"].find_one({"slug": slug.lower()})
+async def get_store(slug: str):
+    store = await get_store_by_slug(slug.lower())
     if not store:
         raise HTTPException(status_code=404, detail="Store not found")
-    store["_id"] = str(store["_id"])
-    return store
+    # Returning the response directly skips FastAPI's jsonable_encoder pass
+    return ORJSONResponse(store)
 
 
 # ---------------------- Products ----------------------
@@ -101,80 +411,266 @@ def get_store(slug: str):
 class CreateProductRequest(BaseModel):
     store_slug: str
     name: str
-    price: float
+    price: float = Field(..., ge=0, le=MAX_PRICE_CENTS / 100, allow_inf_nan=False, description="Price in KES")
     description: Optional[str] = None
     image_url: Optional[str] = None
 
+    @property
+    def price_cents(self) -> int:
+        return round(self.price * 100)
+
 class ProductResponse(BaseModel):
     product_id: str
 
 @app.post("/api/products", response_model=ProductResponse)
-def create_product(payload: CreateProductRequest):
+async def create_product(payload: CreateProductRequest):
+    slug = payload.store_slug.lower()
     # Ensure store exists
-    store = db["store"].find_one({"slug": payload.store_slug.lower()})
+    store = await get_store_by_slug(slug)
     if not store:
         raise HTTPException(status_code=404, detail="Store not found")
 
     product = Product(
-        store_slug=payload.store_slug.lower(),
+        store_slug=slug,
         name=payload.name,
-        price=payload.price,
+        price=payload.price_cents,
         description=payload.description,
         image_url=payload.image_url,
     )
-    product_id = create_document("product", product)
+    product_id = await create_document("product", product)
     return {"product_id": product_id}
 
 
+class BulkProductError(BaseModel):
+    index: int
+    message: str
+
+class BulkProductResponse(BaseModel):
+    product_ids: List[str]
+    errors: List[BulkProductError] = []
+
+@app.post("/api/products/bulk", response_model=BulkProductResponse)
+async def create_products_bulk(payloads: List[CreateProductRequest]):
+    if not payloads:
+        raise HTTPException(status_code=400, detail="No products given")
+    slugs = [p.store_slug.lower() for p in payloads]
+    # Ensure each referenced store exists, checking every slug only once
+    for slug in set(slugs):
+        if not await get_store_by_slug(slug):
+            raise HTTPException(status_code=404, detail=f"Store not found: {slug}")
+
+    products = [
+        Product(
+            store_slug=slug,
+            name=p.name,
+            price=p.price_cents,
+            description=p.description,
+            image_url=p.image_url,
+        )
+        for slug, p in zip(slugs, payloads)
+    ]
+    # Documents are already validated by the Product model. Unordered, so one bad
+    # document does not stop the rest; failures are reported by payload index.
+    product_ids, write_errors = await create_documents(
+        "product", products, bypass_document_validation=True
+    )
+    return {
+        "product_ids": product_ids,
+        "errors": [{"index": err["index"], "message": err.get("errmsg", "")} for err in write_errors],
+    }
+
+
+# Fields returned by product listings
+PRODUCT_LIST_PROJECTION = {
+    "_id": 1,
+    "store_slug": 1,
+    "name": 1,
+    "price": 1,
+    "description": 1,
+    "image_url": 1,
+    "is_active": 1,
+}
+
+
+def _compile_encoder(fields, formatters: Optional[dict] = None) -> Callable[[dict], bytes]:
+    """Generate a JSON encoder specialised for documents with exactly these fields.
+
+    Keys are baked into a bytes template, so only the values go through orjson
+    (for escaping); missing or None fields render as null. ``formatters`` maps
+    a field to a function applied to its value before encoding; it is not
+    called for None.
+    """
+    formatters = formatters or {}
+    template = ("{" + ",".join(f'"{f}":%s' for f in fields) + "}").encode()
+    values = ", ".join(
+        f"dumps(None if (v := doc.get({f!r})) is None else fmt_{f}(v))"
+        if f in formatters
+        else f"dumps(doc.get({f!r}))"
+        for f in fields
+    )
+    namespace = {"template": template, "dumps": orjson.dumps}
+    namespace.update({f"fmt_{f}": fn for f, fn in formatters.items()})
+    exec(f"def render(doc):\n    return template % ({values},)\n", namespace)
+    return namespace["render"]
+
+
+render_product = _compile_encoder(PRODUCT_LIST_PROJECTION, {"price": format_kes})
+
+
 @app.get("/api/products/{store_slug}")
-def list_products(store_slug: str):
-    items = get_documents("product", {"store_slug": store_slug.lower(), "is_active": True})
-    for it in items:
-        it["_id"] = str(it["_id"])
-    return items
+async def list_products(store_slug: str):
+    cursor = db["product"].find(
+        {"store_slug": store_slug.lower(), "is_active": True},
+        PRODUCT_LIST_PROJECTION,
+    )
+    body = b",".join([render_product(doc) async for doc in cursor])
+    return Response(content=b"[" + body + b"]", media_type="application/json")
 
 
 # ---------------------- Orders + MPesa STK (Mockable) ----------------------
 
+class CheckoutItem(BaseModel):
+    # Name and price come from the product, never from the client
+    product_id: str
+    quantity: int = Field(..., ge=1, le=MAX_ITEM_QUANTITY)
+
 class CheckoutRequest(BaseModel):
     store_slug: str
-    items: List[OrderItem]
+    items: List[CheckoutItem]
     customer: CustomerInfo
 
 class CheckoutResponse(BaseModel):
     order_id: str
     status: str
+    total: str
 
-@app.post("/api/checkout", response_model=CheckoutResponse)
-def checkout(payload: CheckoutRequest):
-    # Calculate total
-    total = 0.0
-    for item in payload.items:
-        total += item.price * item.quantity
+async def _finalize_order(order_id: str, store_slug: str, message: str):
+    """Payment + notification side-effects, run after the checkout response is sent"""
+    # Trigger MPesa STK push (sandbox/mocked)
+    # In production integrate Safaricom Daraja API. Here we simulate immediate success.
+    try:
+        await db["order"].update_one(
+            {"_id": ObjectId(order_id)},
+            {"$set": {"status": "paid", "mpesa": {"status": "success"}}},
+        )
+    except Exception:
+        # The response is already sent, so give pollers a final state instead of "pending"
+        logger.exception("Finalizing order %s failed, marking it failed", order_id)
+        try:
+            await db["order"].update_one(
+                {"_id": ObjectId(order_id), "status": "pending"},
+                {"$set": {"status": "failed"}},
+            )
+        except Exception:
+            logger.exception("Marking order %s failed did not succeed either", order_id)
+        return
+
+    # Send WhatsApp notification (mock - store for now)
+    enqueue_notification({
+        "type": "whatsapp",
+        "store_slug": store_slug,
+        "order_id": order_id,
+        "message": message,
+    })
+
+
+async def _place_order(payload: CheckoutRequest, background: BackgroundTasks) -> dict:
+    slug = payload.store_slug.lower()
+    items, prices, quantities = await price_items(slug, payload.items)
+    total = order_total(prices, quantities)
 
     order = Order(
-        store_slug=payload.store_slug.lower(),
-        items=payload.items,
-        total=round(total, 2),
+        store_slug=slug,
+        items=items,
+        total=total,
         customer=payload.customer,
         status="pending",
         mpesa={},
     )
-    order_id = create_document("order", order)
+    # Dump once and reuse the same dict for the notification text
+    order_doc = to_document(order)
+    order_id = await create_document("order", order_doc, copy=False)
+
+    # The client polls /api/order/{order_id} until the order is paid
+    background.add_task(
+        _finalize_order,
+        order_id,
+        slug,
+        f"New order paid: {len(order_doc['items'])} items, KES {format_kes(order_doc['total'])} "
+        f"from {order_doc['customer']['phone']}",
+    )
 
-    # Trigger MPesa STK push (sandbox/mocked)
-    # In production integrate Safaricom Daraja API. Here we simulate immediate success.
-    db["order"].update_one({"_id": ObjectId(order_id)}, {"$set": {"status": "paid", "mpesa": {"status": "success"}}})
+    return {"order_id": order_id, "status": "pending", "total": format_kes(total)}
+
+
+@app.post("/api/checkout", response_model=CheckoutResponse)
+async def checkout(
+    payload: CheckoutRequest,
+    background: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(None),
+):
+    if redis_cli is None or not idempotency_key:
+        return await _place_order(payload, background)
+
+    # Retries with the same key replay the first response without touching Mongo
+    claim_key = f"idem:{idempotency_key}"
+    resp_key = f"idem:{idempotency_key}:resp"
+    # The claim holds a hash of the request so a reused key cannot replay another cart
+    payload_hash = hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+    try:
+        claimed = await redis_cli.set(claim_key, payload_hash, nx=True, ex=IDEMPOTENCY_TTL)
+        claimed_hash, cached = (None, None) if claimed else await redis_cli.mget(claim_key, resp_key)
+    except RedisError:
+        # Idempotency is best-effort: a Redis outage must not block checkouts
+        logger.exception("Redis unavailable, placing checkout without idempotency")
+        return await _place_order(payload, background)
+
+    if not claimed:
+        if claimed_hash is not None and claimed_hash.decode() != payload_hash:
+            raise HTTPException(
+                status_code=422, detail="Idempotency-Key was already used for a different checkout"
+            )
+        if cached is None:
+            raise HTTPException(status_code=409, detail="Checkout with this Idempotency-Key is in progress")
+        return Response(content=cached, media_type="application/json")
+
+    try:
+        resp = await _place_order(payload, background)
+    except BaseException:
+        # Release the key so the client can retry a failed checkout
+        await _release_claim(claim_key)
+        raise
+    try:
+        await redis_cli.set(resp_key, orjson.dumps(resp), ex=IDEMPOTENCY_TTL)
+    except RedisError:
+        # Without a stored response the claim would only ever answer 409
+        logger.exception("Storing checkout response for idempotency failed")
+        await _release_claim(claim_key)
+    return resp
+
+
+async def _release_claim(claim_key: str):
+    try:
+        await redis_cli.delete(claim_key)
+    except RedisError:
+        logger.exception("Releasing idempotency key %s failed; it expires in %ds", claim_key, IDEMPOTENCY_TTL)
+
+
+@app.on_event("shutdown")
+async def close_redis():
+    if redis_cli is not None:
+        await redis_cli.aclose()
 
-    # Send WhatsApp notification (mock - store for now)
-    db["notification"].insert_one({
-        "type": "whatsapp",
-        "store_slug": payload.store_slug.lower(),
-        "order_id": order_id,
-        "message": f"New order paid: {len(payload.items)} items, KES {round(total,2)} from {payload.customer.phone}",
-    })
 
-    return {"order_id": order_id, "status": "paid"}
+@app.get("/api/order/{order_id}")
+async def get_order(order_id: str):
+    order = await db["order"].find_one({"_id": to_object_id(order_id)})
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    order["total"] = format_kes(order["total"])
+    for item in order["items"]:
+        item["price"] = format_kes(item["price"])
+    return ORJSONResponse(order)
 
 
 @app.get("/")
@@ -182,7 +678,7 @@ def read_root():
     return {"message": "Microstore API running"}
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -198,7 +694,7 @@ def test_database():
             response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -6,6 +6,11 @@ Each Pydantic model represents a collection in MongoDB. Collection name is the l
 from pydantic import BaseModel, Field, EmailStr
 from typing import Optional, List, Dict
 
+# Together these bound a single line (price * quantity) to 10**13 cents. A cart can
+# still hold any number of lines, so order_total guards the sum against int64.
+MAX_ITEM_QUANTITY = 10_000
+MAX_PRICE_CENTS = 1_000_000_000  # 10M KES
+
 class Seller(BaseModel):
     name: str = Field(..., description="Seller full name or business name")
     email: Optional[EmailStr] = Field(None, description="Email address")
@@ -24,7 +29,7 @@ class Store(BaseModel):
 class Product(BaseModel):
     store_slug: str = Field(..., description="Slug of owning store")
     name: str = Field(..., description="Product name")
-    price: float = Field(..., ge=0, description="Price in KES")
+    price: int = Field(..., ge=0, le=MAX_PRICE_CENTS, strict=True, description="Price in KES cents")
     description: Optional[str] = Field(None, description="Product description")
     image_url: Optional[str] = Field(None, description="Product image URL")
     is_active: bool = Field(True)
@@ -32,8 +37,8 @@ class Product(BaseModel):
 class OrderItem(BaseModel):
     product_id: str
     name: str
-    price: float
-    quantity: int = Field(..., ge=1)
+    price: int = Field(..., ge=0, strict=True, description="Unit price in KES cents")
+    quantity: int = Field(..., ge=1, le=MAX_ITEM_QUANTITY)
 
 class CustomerInfo(BaseModel):
     name: Optional[str] = None
@@ -42,7 +47,7 @@ class CustomerInfo(BaseModel):
 class Order(BaseModel):
     store_slug: str
     items: List[OrderItem]
-    total: float
+    total: int = Field(..., strict=True, description="Order total in KES cents")
     customer: CustomerInfo
     status: str = Field("pending", description="pending, paid, failed, cancelled")
     mpesa: Dict = Field(default_factory=dict, description="MPesa transaction metadata")